@@ -1,40 +1,51 @@
-from flask import Flask, render_template, request
-from ip_utils import get_ip_address, get_ip_info
+from flask import Flask, request
+from ip_utils import IPLookupError, get_ip_address, get_ip_info
 import ipaddress
 
-app = Flask(__name__)
+# index.html sits next to this module rather than in templates/
+app = Flask(__name__, template_folder='.')
+
+# Loaded and compiled once; production renders skip the loader and its stat checks
+INDEX_TEMPLATE = app.jinja_env.get_template('index.html')
+
+def render_index(**context):
+    # In debug mode go through the loader so template edits are picked up
+    template = app.jinja_env.get_template('index.html') if app.debug else INDEX_TEMPLATE
+    return template.render(**context)
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_index()
 
 @app.route('/lookup', methods=['POST'])
 def lookup():
     ip_type = request.form.get('ip_type')
     custom_ip = request.form.get('custom_ip')
 
-    ip_address = custom_ip.strip() if custom_ip else get_ip_address(ip_type)
+    parsed_ip = None
+    if custom_ip:
+        parsed_ip = parse_public_ip(custom_ip.strip())
+        if parsed_ip is None:
+            return render_index(error="Private or invalid IPs are not allowed.")
 
-    if custom_ip and not is_public_ip(custom_ip):
-        return render_template('index.html', error="Private or invalid IPs are not allowed.")
-
-    if "Error" in ip_address:
-        return render_template('index.html', error=ip_address)
+    try:
+        ip_address = parsed_ip.compressed if parsed_ip else get_ip_address(ip_type)
 
-    ip_info = get_ip_info(ip_address)
+        ip_info = get_ip_info(ip_address)
+    except IPLookupError as e:
+        return render_index(error=str(e))
 
     print(ip_info)
-    
-    if isinstance(ip_info, str) and "Error" in ip_info:
-        return render_template('index.html', error=ip_info)
 
-    return render_template('index.html', ip=ip_address, info=ip_info)
+    return render_index(ip=ip_address, info=ip_info)
 
-def is_public_ip(ip):
+def parse_public_ip(ip):
+    # Parsed once; the address object is returned so callers need not re-parse
     try:
-        return ipaddress.ip_address(ip).is_global
+        parsed = ipaddress.ip_address(ip)
     except ValueError:
-        return False
+        return None
+    return parsed if parsed.is_global else None
 
 if __name__ == '__main__':
     app.run(debug=True)
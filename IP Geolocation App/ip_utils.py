@@ -1,51 +1,91 @@
 import requests
 import unittest
+from enum import Enum
 from unittest.mock import patch
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) seconds, so a slow API cannot hold a Flask worker indefinitely
+TIMEOUT = (2, 3)
+
+# Shared session so repeat lookups reuse pooled TCP/TLS connections
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    # Same policy as the CLI: only transient 502/503 answers are retried, 429
+    # comes back at once, and connect/read failures are not multiplied
+    max_retries=Retry(
+        total=2,
+        connect=0,
+        read=0,
+        backoff_factor=0.2,
+        status_forcelist=[502, 503],
+        respect_retry_after_header=False,
+        raise_on_status=False
+    )
+)
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
+
+
+class LookupErrorKind(Enum):
+    INVALID_IP_TYPE = "invalid_ip_type"
+    REQUEST_FAILED = "request_failed"
+    API_ERROR = "api_error"
+    UNEXPECTED = "unexpected"
+
+
+class IPLookupError(Exception):
+
+    def __init__(self, kind, message):
+        super().__init__(message)
+        self.kind = kind
 
 
 def get_ip_address(ip_type='ipv4'):
 
+    if ip_type == 'ipv6':
+        url = "https://api6.ipify.org"
+    elif ip_type == 'ipv4':
+        url = "https://api.ipify.org"
+    else:
+        raise IPLookupError(
+            LookupErrorKind.INVALID_IP_TYPE,
+            "Error: Invalid IP type specified.  Must be 'ipv4' or 'ipv6'."
+        )
     try:
-        if ip_type == 'ipv6':
-            response = requests.get("https://api6.ipify.org")
-        elif ip_type == 'ipv4':
-            response = requests.get("https://api.ipify.org")
-        else:
-            return "Error: Invalid IP type specified.  Must be 'ipv4' or 'ipv6'."
-
+        response = SESSION.get(url, timeout=TIMEOUT)
         response.raise_for_status()
-        ip_address = response.text.strip()
+        # ipify answers with a bare ASCII address; skip requests' charset detection
+        ip_address = response.content[:64].decode('ascii').strip()
         return ip_address
     except requests.exceptions.RequestException as e:
-        return f"Error: Failed to retrieve IP address: {e}"
+        raise IPLookupError(LookupErrorKind.REQUEST_FAILED, f"Error: Failed to retrieve IP address: {e}") from e
     except Exception as e:
-        return f"An unexpected error occurred: {e}"
+        raise IPLookupError(LookupErrorKind.UNEXPECTED, f"An unexpected error occurred: {e}") from e
 def get_ip_info(ip_address):
 
     try:
-        response = requests.get(f"http://ip-api.com/json/{ip_address}")
+        response = SESSION.get(f"http://ip-api.com/json/{ip_address}", timeout=TIMEOUT)
         response.raise_for_status()
         ip_info = response.json()
-        if ip_info.get("error"):
-            return f"Error from ipapi.co: {ip_info['error']}"
-        return ip_info
     except requests.exceptions.RequestException as e:
-        return f"Error: Failed to retrieve IP information: {e}"
+        raise IPLookupError(LookupErrorKind.REQUEST_FAILED, f"Error: Failed to retrieve IP information: {e}") from e
     except Exception as e:
-        return f"An unexpected error occurred: {e}"
+        raise IPLookupError(LookupErrorKind.UNEXPECTED, f"An unexpected error occurred: {e}") from e
+    if ip_info.get("error"):
+        raise IPLookupError(LookupErrorKind.API_ERROR, f"Error from ipapi.co: {ip_info['error']}")
+    return ip_info
 
 def display_ip_info(ip_type):
 
-    ip_address = get_ip_address(ip_type)
-    if "Error:" in ip_address:
-        print(ip_address)
-        return
-
-    print(f"Your public {ip_type.upper()} address is: {ip_address}")
-    ip_info = get_ip_info(ip_address)
-
-    if isinstance(ip_info, str) and "Error:" in ip_info:
-        print(ip_info)
+    try:
+        ip_address = get_ip_address(ip_type)
+        print(f"Your public {ip_type.upper()} address is: {ip_address}")
+        ip_info = get_ip_info(ip_address)
+    except IPLookupError as e:
+        print(e)
         return
 
     if ip_info:
@@ -69,45 +109,55 @@ if __name__ == "__main__":
 
 class TestIpAddressApp(unittest.TestCase):
 
-    @patch('requests.get')
+    @patch('ip_utils.SESSION.get')
     def test_get_ip_address_ipv4(self, mock_get):
 
         mock_response = unittest.mock.Mock()
-        mock_response.text = "192.0.2.1"
+        mock_response.content = b"192.0.2.1"
         mock_response.status_code = 200
         mock_get.return_value = mock_response
 
         ip_address = get_ip_address('ipv4')
         self.assertEqual(ip_address, "192.0.2.1")
-        mock_get.assert_called_once_with("https://api.ipify.org")
+        mock_get.assert_called_once_with("https://api.ipify.org", timeout=TIMEOUT)
 
-    @patch('requests.get')
+    @patch('ip_utils.SESSION.get')
     def test_get_ip_address_ipv6(self, mock_get):
 
         mock_response = unittest.mock.Mock()
-        mock_response.text = "2001:db8::1"
+        mock_response.content = b"2001:db8::1"
         mock_response.status_code = 200
         mock_get.return_value = mock_response
 
         ip_address = get_ip_address('ipv6')
         self.assertEqual(ip_address, "2001:db8::1")
-        mock_get.assert_called_once_with("https://api6.ipify.org")
+        mock_get.assert_called_once_with("https://api6.ipify.org", timeout=TIMEOUT)
+
+    def test_session_retry_policy(self):
+        retries = SESSION.get_adapter("https://api.ipify.org").max_retries
+        self.assertEqual((retries.connect, retries.read), (0, 0))
+        self.assertNotIn(429, retries.status_forcelist)
+        self.assertFalse(retries.respect_retry_after_header)
 
-    @patch('requests.get')
+    @patch('ip_utils.SESSION.get')
     def test_get_ip_address_invalid_type(self, mock_get):
 
-        ip_address = get_ip_address('invalid')
-        self.assertEqual(ip_address, "Error: Invalid IP type specified.  Must be 'ipv4' or 'ipv6'.")
+        with self.assertRaises(IPLookupError) as ctx:
+            get_ip_address('invalid')
+        self.assertEqual(ctx.exception.kind, LookupErrorKind.INVALID_IP_TYPE)
+        self.assertEqual(str(ctx.exception), "Error: Invalid IP type specified.  Must be 'ipv4' or 'ipv6'.")
         mock_get.assert_not_called()
 
-    @patch('requests.get')
+    @patch('ip_utils.SESSION.get')
     def test_get_ip_address_request_error(self, mock_get):
 
         mock_get.side_effect = requests.exceptions.RequestException("Request failed")
-        ip_address = get_ip_address('ipv4')
-        self.assertTrue(ip_address.startswith("Error: Failed to retrieve IP address:"))
+        with self.assertRaises(IPLookupError) as ctx:
+            get_ip_address('ipv4')
+        self.assertEqual(ctx.exception.kind, LookupErrorKind.REQUEST_FAILED)
+        self.assertTrue(str(ctx.exception).startswith("Error: Failed to retrieve IP address:"))
 
-    @patch('requests.get')
+    @patch('ip_utils.SESSION.get')
     def test_get_ip_info_success(self, mock_get):
 
         mock_response = unittest.mock.Mock()
@@ -132,9 +182,9 @@ class TestIpAddressApp(unittest.TestCase):
             "asn": "AS15169"
         }
         self.assertEqual(ip_info, expected_info)
-        mock_get.assert_called_once_with("https://ipapi.co/192.0.2.1/json/")
+        mock_get.assert_called_once_with("https://ipapi.co/192.0.2.1/json/", timeout=TIMEOUT)
 
-    @patch('requests.get')
+    @patch('ip_utils.SESSION.get')
     def test_get_ip_info_api_error(self, mock_get):
 
         mock_response = unittest.mock.Mock()
@@ -142,22 +192,28 @@ class TestIpAddressApp(unittest.TestCase):
         mock_response.status_code = 200
         mock_get.return_value = mock_response
 
-        ip_info = get_ip_info("invalid_ip")
-        self.assertEqual(ip_info, "Error from ipapi.co: Invalid IP address")
+        with self.assertRaises(IPLookupError) as ctx:
+            get_ip_info("invalid_ip")
+        self.assertEqual(ctx.exception.kind, LookupErrorKind.API_ERROR)
+        self.assertEqual(str(ctx.exception), "Error from ipapi.co: Invalid IP address")
 
-    @patch('requests.get')
+    @patch('ip_utils.SESSION.get')
     def test_get_ip_info_request_error(self, mock_get):
 
         mock_get.side_effect = requests.exceptions.RequestException("Request failed")
-        ip_info = get_ip_info("192.0.2.1")
-        self.assertTrue(ip_info.startswith("Error: Failed to retrieve IP information:"))
+        with self.assertRaises(IPLookupError) as ctx:
+            get_ip_info("192.0.2.1")
+        self.assertEqual(ctx.exception.kind, LookupErrorKind.REQUEST_FAILED)
+        self.assertTrue(str(ctx.exception).startswith("Error: Failed to retrieve IP information:"))
 
-    @patch('requests.get')
+    @patch('ip_utils.SESSION.get')
     def test_get_ip_info_unexpected_error(self, mock_get):
 
         mock_get.side_effect = Exception("Unexpected error")
-        ip_info = get_ip_info("192.0.2.1")
-        self.assertTrue(ip_info.startswith("An unexpected error occurred:"))
+        with self.assertRaises(IPLookupError) as ctx:
+            get_ip_info("192.0.2.1")
+        self.assertEqual(ctx.exception.kind, LookupErrorKind.UNEXPECTED)
+        self.assertTrue(str(ctx.exception).startswith("An unexpected error occurred:"))
 if __name__ == '__main__':
     unittest.main()
 
@@ -1,38 +1,224 @@
-# extra imports for cache and warnings
-import json
+# extra imports for cache and concurrency
+import http.server
+import socket
+import sqlite3
+import threading
 import time
+from functools import lru_cache
 from pathlib import Path
-import warnings
+from queue import Queue
 
+import orjson
 import requests
+import truststore
 import typer
-from typing import Optional
+from geoip2fast import GeoIP2Fast
+from requests.adapters import HTTPAdapter
+from typing import Callable, Iterator, NamedTuple, Optional
+import tempfile
+from typer.testing import CliRunner
 import unittest
 from unittest.mock import patch
-from urllib3.exceptions import InsecureRequestWarning
+from urllib3.util.retry import Retry
 
-# Suppress insecure HTTPS warnings
-warnings.filterwarnings('ignore', category=InsecureRequestWarning)
+# Verify HTTPS against the OS trust store
+truststore.inject_into_ssl()
 
-CACHE_FILE = Path.home() / ".cache" / "ipinfo_cache.json"
+CACHE_FILE = Path.home() / ".cache" / "ipinfo_cache.db"
 CACHE_TTL = 24 * 3600  # 24 hours
+NEGATIVE_CACHE_TTL = 300  # 5 minutes, for failed lookups
+# ip-api.com's free batch endpoint is plaintext HTTP only; pass --bulk-url (or
+# set IPINFO_BULK_URL) to use an HTTPS one, e.g. the keyed pro.ip-api.com
+BULK_URL = "http://ip-api.com/batch"
+BULK_CHUNK_SIZE = 100  # max IPs per ip-api.com batch request
+# (connect, read): a broken IPv6 route fails fast and the next endpoint wins
+TIMEOUT = (2, 3)
 
+# Shared session so repeat lookups reuse pooled TCP/TLS connections
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    # Only transient 502/503 answers are retried. 429 is handled by the
+    # explicit fallback in get_ip_info, and connect/read failures are not
+    # retried so TIMEOUT bounds how long a dead endpoint can stall a lookup.
+    max_retries=Retry(
+        total=2,
+        connect=0,
+        read=0,
+        backoff_factor=0.2,
+        status_forcelist=[502, 503],
+        respect_retry_after_header=False,
+        raise_on_status=False
+    )
+)
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
+
+def _prewarm_dns(host: str) -> None:
+    try:
+        socket.getaddrinfo(host, 443)
+    except OSError:
+        pass
+
+# Resolve the API hosts in the background while the rest of the module loads
+for _host in ('api.ipify.org', 'api6.ipify.org', 'ipv6.icanhazip.com', 'ipapi.co'):
+    threading.Thread(target=_prewarm_dns, args=(_host,), daemon=True).start()
+
+# In-process geolocation DB. The bundled file only knows country and AS name,
+# so it is only the last resort when the remote lookup fails.
+GEO_DATA_FILE = "geoip2fast-asn-ipv6.dat.gz"
+
+class GeoInfo(NamedTuple):
+    country_name: str
+    city: str
+    latitude: float | str
+    longitude: float | str
+    org: str
+    asn: str
+
+def _make_normalizer(
+    name: str,
+    fields: dict[str, tuple[tuple[str, ...], object]],
+    coerce_missing: bool = False
+) -> Callable[[dict], GeoInfo]:
+    # Compile a straight-line GeoInfo builder for one provider schema.
+    # fields maps each GeoInfo field to (payload keys, default): keys are tried
+    # in order and an empty tuple means the default is used as a constant.
+    # With coerce_missing, null/empty values also fall through to the default.
+    def expr(keys: tuple[str, ...], default: object) -> str:
+        if not keys:
+            return repr(default)
+        if coerce_missing:
+            return "(" + " or ".join([f"d.get({key!r})" for key in keys] + [repr(default)]) + ")"
+        return f"d.get({keys[0]!r}, {default!r})"
+    args = ", ".join(f"{field}={expr(keys, default)}" for field, (keys, default) in fields.items())
+    namespace = {"GeoInfo": GeoInfo}
+    exec(f"def {name}(d):\n    return GeoInfo({args})\n", namespace)
+    return namespace[name]
+
+_norm_ipapi = _make_normalizer("_norm_ipapi", {
+    "country_name": (("country_name",), "N/A"),
+    "city": (("city",), "N/A"),
+    "latitude": (("latitude",), "N/A"),
+    "longitude": (("longitude",), "N/A"),
+    "org": (("org",), "N/A"),
+    "asn": (("asn",), "N/A")
+})
+# geolocation-db sends null for unknown values, so those are coerced
+_norm_geodb = _make_normalizer("_norm_geodb", {
+    "country_name": (("country_name", "country"), "N/A"),
+    "city": (("city",), "N/A"),
+    "latitude": (("latitude",), 0),
+    "longitude": (("longitude",), 0),
+    "org": (("IPv4",), "N/A"),
+    "asn": ((), "N/A")
+}, coerce_missing=True)
+# Cache rows store GeoInfo._asdict(); rows written before the schema was
+# narrowed hold full ipapi.co payloads, which use the same key names
+_norm_cached = _make_normalizer("_norm_cached", {
+    field: ((field,), "N/A") for field in GeoInfo._fields
+})
+
+_CACHE_WRITE_LOCK = threading.Lock()
+# Background stale-while-revalidate refreshes, joined before the CLI exits
+_REFRESH_THREADS: list[threading.Thread] = []
+
+@lru_cache(maxsize=1)
+def _connect(path: Path) -> sqlite3.Connection:
+    # Opened once per process and cache file; reused by every lookup
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    # WAL lets concurrent CLI invocations read while another one writes
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS cache ("
+        "ip TEXT PRIMARY KEY, ts INTEGER, info BLOB, negative INTEGER NOT NULL DEFAULT 0, "
+        "refresh_ts INTEGER NOT NULL DEFAULT 0)"
+    )
+    # Caches created before these columns were introduced
+    for column in ("negative", "refresh_ts"):
+        try:
+            conn.execute(f"ALTER TABLE cache ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+        except sqlite3.OperationalError:
+            pass
+    return conn
+
+# Returns the full record; entries up to 2*CACHE_TTL old are kept for stale serving
 def load_cache(ip_address: str) -> dict | None:
     if not CACHE_FILE.exists():
         return None
-    data = json.loads(CACHE_FILE.read_text())
-    entry = data.get(ip_address)
-    if not entry or (time.time() - entry["timestamp"] > CACHE_TTL):
+    row = _connect(CACHE_FILE).execute(
+        "SELECT ts, info, negative FROM cache WHERE ip = ? AND ts > ?",
+        (ip_address, int(time.time()) - 2 * CACHE_TTL)
+    ).fetchone()
+    if not row:
         return None
-    return entry["info"]
+    info = orjson.loads(row[1])
+    negative = bool(row[2])
+    return {"timestamp": row[0], "info": info if negative else _norm_cached(info), "negative": negative}
+
+def load_cache_many(ip_addresses: list[str]) -> dict[str, GeoInfo]:
+    # Fresh positive entries only, one query per BULK_CHUNK_SIZE IPs so the
+    # IN list stays under SQLite's host-parameter limit
+    if not ip_addresses or not CACHE_FILE.exists():
+        return {}
+    conn = _connect(CACHE_FILE)
+    cutoff = int(time.time()) - CACHE_TTL
+    results: dict[str, GeoInfo] = {}
+    for start in range(0, len(ip_addresses), BULK_CHUNK_SIZE):
+        chunk = ip_addresses[start:start + BULK_CHUNK_SIZE]
+        placeholders = ", ".join("?" * len(chunk))
+        rows = conn.execute(
+            f"SELECT ip, info FROM cache WHERE ip IN ({placeholders}) AND ts > ? AND negative = 0",
+            (*chunk, cutoff)
+        ).fetchall()
+        results.update((ip, _norm_cached(orjson.loads(info))) for ip, info in rows)
+    return results
 
-def save_cache(ip_address: str, info: dict):
-    data: dict = {}
-    if CACHE_FILE.exists():
-        data = json.loads(CACHE_FILE.read_text())
-    data[ip_address] = {"timestamp": time.time(), "info": info}
-    CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
-    CACHE_FILE.write_text(json.dumps(data))
+def save_cache(ip_address: str, info: GeoInfo | dict, negative: bool = False):
+    # Positive entries store the narrowed GeoInfo, negative ones an {"error": ...} dict
+    if isinstance(info, GeoInfo):
+        info = info._asdict()
+    # Whole-second epoch integers: cheaper to store and compare than floats
+    now = int(time.time())
+    # The connection is shared with refresh threads; keep read-compare-write atomic
+    with _CACHE_WRITE_LOCK:
+        if negative:
+            # A failed lookup never overwrites a positive entry that can still be served stale
+            _connect(CACHE_FILE).execute(
+                "INSERT INTO cache (ip, ts, info, negative) VALUES (?, ?, ?, 1) "
+                "ON CONFLICT(ip) DO UPDATE SET ts = excluded.ts, info = excluded.info, negative = 1 "
+                "WHERE cache.negative = 1 OR cache.ts <= ?",
+                (ip_address, now, orjson.dumps(info), now - 2 * CACHE_TTL)
+            )
+            return
+        conn = _connect(CACHE_FILE)
+        blob = orjson.dumps(info)
+        row = conn.execute(
+            "SELECT ts, info FROM cache WHERE ip = ? AND negative = 0", (ip_address,)
+        ).fetchone()
+        if row and row[1] == blob:
+            # Unchanged info: skip the write while fresh, otherwise only bump the timestamp
+            if row[0] > now - CACHE_TTL // 2:
+                return
+            conn.execute("UPDATE cache SET ts = ? WHERE ip = ?", (now, ip_address))
+            return
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (ip, ts, info, negative) VALUES (?, ?, ?, 0)",
+            (ip_address, now, blob)
+        )
+
+def claim_refresh(ip_address: str) -> bool:
+    # Record a refresh attempt; False if one already started within
+    # NEGATIVE_CACHE_TTL, so failing refreshes are not retried on every call
+    now = int(time.time())
+    with _CACHE_WRITE_LOCK:
+        cursor = _connect(CACHE_FILE).execute(
+            "UPDATE cache SET refresh_ts = ? WHERE ip = ? AND refresh_ts <= ?",
+            (now, ip_address, now - NEGATIVE_CACHE_TTL)
+        )
+    return cursor.rowcount == 1
 
 app = typer.Typer(
     help="CLI application to fetch public or target IP and geolocation info.",
@@ -40,6 +226,18 @@ app = typer.Typer(
     no_args_is_help=True
 )
 
+def _fetch_ip(url: str, proxies: Optional[dict]) -> str:
+    resp = SESSION.get(url, proxies=proxies, timeout=TIMEOUT)
+    resp.raise_for_status()
+    # ipify answers with a bare ASCII address; skip requests' charset detection
+    return resp.content[:64].decode('ascii').strip()
+
+def _race_fetch_ip(url: str, proxies: Optional[dict], results: Queue) -> None:
+    try:
+        results.put((_fetch_ip(url, proxies), None))
+    except (requests.RequestException, UnicodeDecodeError) as e:
+        results.put((None, e))
+
 def get_ip_address(
     ip_type: str = 'ipv4',
     proxy: Optional[str] = None
@@ -53,13 +251,23 @@ def get_ip_address(
         "https://ipv6.icanhazip.com"
     ]
     last_error = None
-    for url in urls:
+    if len(urls) == 1:
         try:
-            resp = requests.get(url, proxies=proxies, verify=False, timeout=5)
-            resp.raise_for_status()
-            return resp.text.strip()
-        except requests.RequestException as e:
+            return _fetch_ip(urls[0], proxies)
+        except (requests.RequestException, UnicodeDecodeError) as e:
             last_error = e
+    else:
+        # Race every candidate endpoint and keep the first success, so the IPv6
+        # path costs max(RTT) instead of sum(RTT). Daemon threads: the loser
+        # must not keep the CLI alive until it times out.
+        results: Queue = Queue()
+        for url in urls:
+            threading.Thread(target=_race_fetch_ip, args=(url, proxies, results), daemon=True).start()
+        for _ in urls:
+            ip, error = results.get()
+            if ip is not None:
+                return ip
+            last_error = error
     if ip_type == 'ipv6':
         typer.echo(
             "Unable to retrieve an IPv6 address: your environment does not appear to support IPv6 or DNS resolution failed.",
@@ -69,59 +277,212 @@ def get_ip_address(
         typer.echo(f"Error fetching IPv4 address: {last_error}", err=True)
     raise typer.Exit(1)
 
+@lru_cache(maxsize=1)
+def _geo() -> GeoIP2Fast:
+    # Loading the file costs ~0.3 s and ~110 MB, so only pay for it when needed
+    return GeoIP2Fast(geoip2fast_data_file=GEO_DATA_FILE)
+
+def lookup_local(ip_address: str) -> GeoInfo | None:
+    result = _geo().lookup(ip_address).to_dict()
+    # '' means an invalid IP, '--' a private/reserved or unknown range
+    if result["country_code"] in ('', '--'):
+        return None
+    return GeoInfo(
+        country_name=result["country_name"],
+        city=result["city"] or "N/A",
+        latitude="N/A",
+        longitude="N/A",
+        org=result["asn_name"] or "N/A",
+        asn="N/A"
+    )
+
 def get_ip_info(
     ip_address: str,
     proxy: Optional[str] = None,
     skip_cache: bool=False
-) -> dict:
+) -> GeoInfo:
+    try:
+        return _get_remote_ip_info(ip_address, proxy, skip_cache)
+    except typer.Exit:
+        local = lookup_local(ip_address)
+        if local is None:
+            raise
+        typer.echo("Using the local database instead (country and ISP only).", err=True)
+        return local
+
+def _get_remote_ip_info(
+    ip_address: str,
+    proxy: Optional[str] = None,
+    skip_cache: bool=False
+) -> GeoInfo:
     if not skip_cache:
         cached = load_cache(ip_address)
         if cached:
-            return cached
+            age = int(time.time()) - cached["timestamp"]
+            if cached["negative"]:
+                if age <= NEGATIVE_CACHE_TTL:
+                    typer.echo(f"Cached lookup failure: {cached['info']['error']}", err=True)
+                    raise typer.Exit(1)
+            elif age <= CACHE_TTL:
+                return cached["info"]
+            else:
+                # Stale-while-revalidate: answer now, refresh in the background
+                if claim_refresh(ip_address):
+                    thread = threading.Thread(target=_refresh_cache, args=(ip_address, proxy), daemon=True)
+                    thread.start()
+                    _REFRESH_THREADS.append(thread)
+                return cached["info"]
     proxies = {'http': proxy, 'https': proxy} if proxy else None
     try:
-        resp = requests.get(
+        resp = SESSION.get(
             f"https://ipapi.co/{ip_address}/json/",
             proxies=proxies,
-            verify=False,
-            timeout=5
+            timeout=TIMEOUT
         )
         resp.raise_for_status()
         data = resp.json()
         if data.get('error'):
             typer.echo(f"API error: {data['error']}", err=True)
+            save_cache(ip_address, {"error": f"API error: {data['error']}"}, negative=True)
             raise typer.Exit(1)
+        info = _norm_ipapi(data)
     except requests.HTTPError as e:
         if e.response is not None and e.response.status_code == 429:
             typer.echo("Rate limit reached on ipapi.co, using fallback...", err=True)
             try:
-                fb = requests.get(
+                fb = SESSION.get(
                     f"https://geolocation-db.com/json/{ip_address}&position=true",
                     proxies=proxies,
-                    verify=False,
-                    timeout=5
+                    timeout=TIMEOUT
                 )
                 fb.raise_for_status()
-                fbdata = fb.json()
-                data = {
-                    "country_name": fbdata.get("country_name") or fbdata.get("country") or "N/A",
-                    "city": fbdata.get("city") or "N/A",
-                    "latitude": fbdata.get("latitude") or 0,
-                    "longitude": fbdata.get("longitude") or 0,
-                    "org": fbdata.get("IPv4") or "N/A",
-                    "asn": "N/A"
-                }
+                info = _norm_geodb(fb.json())
             except requests.RequestException as e2:
                 typer.echo(f"Fallback service error: {e2}", err=True)
+                if isinstance(e2, requests.HTTPError):
+                    save_cache(ip_address, {"error": f"Fallback service error: {e2}"}, negative=True)
                 raise typer.Exit(1)
         else:
             typer.echo(f"Error fetching IP information: {e}", err=True)
+            save_cache(ip_address, {"error": f"Error fetching IP information: {e}"}, negative=True)
             raise typer.Exit(1)
     except requests.RequestException as e:
         typer.echo(f"Network error fetching IP information: {e}", err=True)
         raise typer.Exit(1)
-    save_cache(ip_address, data)
-    return data
+    save_cache(ip_address, info)
+    return info
+
+def wait_for_refreshes() -> None:
+    # Give background refreshes one request's worth of time before the CLI
+    # exits; an abandoned refresh is retried after NEGATIVE_CACHE_TTL.
+    deadline = time.monotonic() + sum(TIMEOUT)
+    while _REFRESH_THREADS:
+        _REFRESH_THREADS.pop().join(max(0, deadline - time.monotonic()))
+
+def _refresh_cache(ip_address: str, proxy: Optional[str]) -> None:
+    try:
+        _get_remote_ip_info(ip_address, proxy, skip_cache=True)
+    except typer.Exit:
+        # Already reported by the lookup itself
+        pass
+    except (requests.RequestException, sqlite3.Error, ValueError) as e:
+        # e.g. a non-JSON body or a locked cache file; the stale entry stays
+        typer.echo(f"Background refresh failed for {ip_address}: {e}", err=True)
+
+def probe_self(proxy: Optional[str], results: Queue) -> None:
+    # ipapi.co without an IP reports the caller's address together with its geolocation
+    proxies = {'http': proxy, 'https': proxy} if proxy else None
+    data = None
+    try:
+        resp = SESSION.get("https://ipapi.co/json/", proxies=proxies, timeout=TIMEOUT)
+        resp.raise_for_status()
+        data = resp.json()
+        if data.get('error') or not data.get('ip'):
+            data = None
+    except (requests.RequestException, ValueError):
+        pass
+    finally:
+        results.put(data)
+
+def get_own_ip_info_uncached(
+    ip_type: str = 'ipv4',
+    proxy: Optional[str] = None
+) -> tuple[str, GeoInfo]:
+    # Only used with --no-cache: the remote lookup is certain to happen, so race
+    # the self-probe against address discovery and save a round trip when it
+    # saw the same address. Daemon thread, as for the IPv6 endpoint race.
+    probed: Queue = Queue(maxsize=1)
+    threading.Thread(target=probe_self, args=(proxy, probed), daemon=True).start()
+    ip = get_ip_address(ip_type, proxy)
+    data = probed.get()
+    if data and data['ip'] == ip:
+        info = _norm_ipapi(data)
+        save_cache(ip, info)
+        return ip, info
+    return ip, get_ip_info(ip, proxy, skip_cache=True)
+
+def get_ip_info_bulk(
+    ip_addresses: list[str],
+    proxy: Optional[str] = None,
+    skip_cache: bool = False,
+    bulk_url: str = BULK_URL
+) -> Iterator[tuple[list[str], dict[str, GeoInfo]]]:
+    # Yields (ips, results) as each batch completes: cache hits first, then one
+    # per remote chunk. IPs missing from results have no information at all.
+    pending = list(dict.fromkeys(ip_addresses))
+    if not skip_cache:
+        cached = load_cache_many(pending)
+        if cached:
+            yield list(cached), cached
+            pending = [ip for ip in pending if ip not in cached]
+    proxies = {'http': proxy, 'https': proxy} if proxy else None
+    for start in range(0, len(pending), BULK_CHUNK_SIZE):
+        chunk = pending[start:start + BULK_CHUNK_SIZE]
+        results: dict[str, GeoInfo] = {}
+        entries = []
+        try:
+            resp = SESSION.post(
+                bulk_url,
+                json=chunk,
+                params={'fields': 'status,message,query,country,city,lat,lon,isp,org,as'},
+                proxies=proxies,
+                timeout=TIMEOUT
+            )
+            resp.raise_for_status()
+            entries = resp.json()
+        except (requests.RequestException, ValueError) as e:
+            # e.g. 429 once ip-api's 15 batches/min are used up; keep going
+            typer.echo(f"Bulk lookup failed for {len(chunk)} IPs: {e}", err=True)
+        for entry in entries:
+            if entry.get('status') != 'success':
+                typer.echo(f"API error for {entry.get('query')}: {entry.get('message')}", err=True)
+                continue
+            info = GeoInfo(
+                country_name=entry.get("country") or "N/A",
+                city=entry.get("city") or "N/A",
+                latitude=entry.get("lat", "N/A"),
+                longitude=entry.get("lon", "N/A"),
+                org=entry.get("org") or entry.get("isp") or "N/A",
+                asn=(entry.get("as") or "N/A").split(" ", 1)[0]
+            )
+            save_cache(entry["query"], info)
+            results[entry["query"]] = info
+        # Anything the remote lookup could not answer falls back to the local record
+        for ip in chunk:
+            if ip not in results:
+                local = lookup_local(ip)
+                if local:
+                    results[ip] = local
+        yield chunk, results
+
+def print_ip_info(info: GeoInfo) -> None:
+    typer.echo("\nGeolocation and ISP information:")
+    typer.echo(f"  Country  : {info.country_name}")
+    typer.echo(f"  City     : {info.city}")
+    typer.echo(f"  Latitude : {info.latitude}")
+    typer.echo(f"  Longitude: {info.longitude}")
+    typer.echo(f"  ISP      : {info.org}")
+    typer.echo(f"  ASN      : {info.asn}")
 
 @app.command()
 def main(
@@ -139,7 +500,22 @@ def main(
         '--proxy', '-p',
         help='Proxy URL to use for requests'
     ),
-    no_cache: bool = typer.Option(False, '--no-cache', help='Skip local cache and force API call')
+    no_cache: bool = typer.Option(False, '--no-cache', help='Skip local cache and force API call'),
+    ips_file: Optional[Path] = typer.Option(
+        None,
+        '--ips-file', '-f',
+        exists=True,
+        dir_okay=False,
+        readable=True,
+        help='Look up every IP listed (one per line) in this file using batched requests '
+             '(sent over plaintext HTTP unless --bulk-url is an HTTPS endpoint)'
+    ),
+    bulk_url: str = typer.Option(
+        BULK_URL,
+        '--bulk-url',
+        envvar='IPINFO_BULK_URL',
+        help='ip-api.com compatible batch endpoint used by --ips-file'
+    )
 ) -> None:
     """
     Displays a public IP address (your own by default) and its geolocation.
@@ -164,26 +540,43 @@ def main(
       # Verify proxy usage locally
       python main.py ipv4 --target-ip 190.158.28.100 --proxy http://127.0.0.1:8899
 
+      # Look up many IPs at once, batched into as few requests as possible
+      python main.py --ips-file ips.txt
+
+      # Same, over HTTPS with an ip-api.com pro key
+      python main.py --ips-file ips.txt --bulk-url "https://pro.ip-api.com/batch?key=KEY"
+
       # Run the full test suite
       python -m unittest main -v
     """
     if proxy:
         typer.echo(f"Using proxy: {proxy}")
+    if ips_file:
+        with ips_file.open() as fh:
+            ips = [line.strip() for line in fh if line.strip()]
+        for chunk, infos in get_ip_info_bulk(ips, proxy, skip_cache=no_cache, bulk_url=bulk_url):
+            for ip in chunk:
+                typer.echo(f"\n{ip}")
+                if ip in infos:
+                    print_ip_info(infos[ip])
+                else:
+                    typer.echo("  No geolocation information available.")
+        return
     if target_ip:
         ip = target_ip
         typer.echo(f"Using target IP: {ip}")
     else:
         typer.echo(f"Querying {ip_type.upper()} address…")
+        if no_cache:
+            ip, info = get_own_ip_info_uncached(ip_type, proxy)
+            typer.echo(f"Your public {ip_type.upper()} address is: {ip}")
+            print_ip_info(info)
+            return
         ip = get_ip_address(ip_type, proxy)
         typer.echo(f"Your public {ip_type.upper()} address is: {ip}")
     info = get_ip_info(ip, proxy, skip_cache=no_cache)
-    typer.echo("\nGeolocation and ISP information:")
-    typer.echo(f"  Country  : {info.get('country_name','N/A')}")
-    typer.echo(f"  City     : {info.get('city','N/A')}")
-    typer.echo(f"  Latitude : {info.get('latitude','N/A')}")
-    typer.echo(f"  Longitude: {info.get('longitude','N/A')}")
-    typer.echo(f"  ISP      : {info.get('org','N/A')}")
-    typer.echo(f"  ASN      : {info.get('asn','N/A')}")
+    print_ip_info(info)
+    wait_for_refreshes()
 
 if __name__ == '__main__':
     app()
@@ -193,9 +586,194 @@ if __name__ == '__main__':
 # ------------------------
 class TestIpAddressApp(unittest.TestCase):
 
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        cache_patch = patch('main.CACHE_FILE', Path(self.tmp.name) / "ipinfo_cache.db")
+        cache_patch.start()
+        _connect.cache_clear()
+        self.addCleanup(cache_patch.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_cache_roundtrip(self):
+        self.assertIsNone(load_cache("192.0.2.1"))
+        save_cache("192.0.2.1", _norm_cached({"country_name": "US"}))
+        entry = load_cache("192.0.2.1")
+        self.assertEqual(entry["info"], _norm_cached({"country_name": "US"}))
+        self.assertFalse(entry["negative"])
+
+    def test_cache_timestamp_is_int(self):
+        save_cache("192.0.2.1", _norm_cached({"country_name": "US"}))
+        self.assertIsInstance(load_cache("192.0.2.1")["timestamp"], int)
+
+    def test_cache_connection_reused(self):
+        save_cache("192.0.2.1", _norm_cached({"country_name": "US"}))
+        load_cache("192.0.2.1")
+        self.assertEqual(_connect.cache_info().misses, 1)
+
+    def test_save_cache_unchanged_skips_write(self):
+        save_cache("192.0.2.1", _norm_cached({"country_name": "US"}))
+        first = load_cache("192.0.2.1")["timestamp"]
+        save_cache("192.0.2.1", _norm_cached({"country_name": "US"}))
+        self.assertEqual(load_cache("192.0.2.1")["timestamp"], first)
+        later = time.time() + CACHE_TTL
+        with patch('main.time.time', return_value=later):
+            save_cache("192.0.2.1", _norm_cached({"country_name": "US"}))
+            self.assertEqual(load_cache("192.0.2.1")["timestamp"], int(later))
+
+    def test_cache_expired(self):
+        save_cache("192.0.2.1", _norm_cached({"country_name": "US"}))
+        with patch('main.time.time', return_value=time.time() + 2 * CACHE_TTL + 1):
+            self.assertIsNone(load_cache("192.0.2.1"))
+
+    def test_load_cache_many_beyond_chunk_size(self):
+        ips = [f"192.0.2.{i}" for i in range(10)]
+        for ip in ips:
+            save_cache(ip, _norm_cached({"country_name": "US"}))
+        with patch('main.BULK_CHUNK_SIZE', 3):
+            self.assertEqual(len(load_cache_many(ips)), len(ips))
+
+    @patch('main.lookup_local', return_value=None)
+    @patch('main.SESSION.get')
+    def test_get_ip_info_negative_cached(self, mock_get, mock_local):
+        response_404 = unittest.mock.Mock()
+        response_404.status_code = 404
+        mock_get.side_effect = requests.HTTPError(response=response_404)
+        with self.assertRaises(typer.Exit):
+            get_ip_info("192.0.2.1")
+        with self.assertRaises(typer.Exit):
+            get_ip_info("192.0.2.1")
+        mock_get.assert_called_once()
+
+    @patch('main.lookup_local', return_value=None)
+    @patch('main.SESSION.post')
+    def test_get_ip_info_bulk_failed_chunk_continues(self, mock_post, mock_local):
+        response_429 = unittest.mock.Mock()
+        response_429.status_code = 429
+        ok = unittest.mock.Mock()
+        ok.json.return_value = [{"status": "success", "query": "192.0.2.200", "country": "US"}]
+        mock_post.side_effect = [requests.HTTPError(response=response_429), ok]
+        ips = [f"192.0.2.{i}" for i in range(1, BULK_CHUNK_SIZE + 1)] + ["192.0.2.200"]
+        batches = list(get_ip_info_bulk(ips))
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual([len(chunk) for chunk, _ in batches], [BULK_CHUNK_SIZE, 1])
+        self.assertEqual([list(infos) for _, infos in batches], [[], ["192.0.2.200"]])
+
+    @patch('main.lookup_local', return_value=None)
+    @patch('main.SESSION.post')
+    def test_main_ips_file_prints_each_batch(self, mock_post, mock_local):
+        ok = unittest.mock.Mock()
+        ok.json.return_value = [{"status": "success", "query": "192.0.2.2", "country": "US"}]
+        mock_post.return_value = ok
+        save_cache("192.0.2.1", _norm_cached({"country_name": "Cached"}))
+        ips_file = Path(self.tmp.name) / "ips.txt"
+        ips_file.write_text("192.0.2.2\n192.0.2.1\n192.0.2.3\n")
+        result = CliRunner().invoke(app, ["--ips-file", str(ips_file)])
+        self.assertEqual(result.exit_code, 0)
+        # Cache hits come out before the remote batch
+        self.assertLess(result.output.index("Cached"), result.output.index("192.0.2.2"))
+        self.assertIn("192.0.2.3\n  No geolocation information available.", result.output)
+
+    @patch('main.get_ip_info')
+    @patch('main.get_ip_address', return_value="192.0.2.1")
+    @patch('main.SESSION.get')
+    def test_get_own_ip_info_uncached_uses_probe(self, mock_get, mock_address, mock_info):
+        mock_get.return_value.json.return_value = {"ip": "192.0.2.1", "country_name": "US"}
+        ip, info = get_own_ip_info_uncached('ipv4')
+        self.assertEqual((ip, info.country_name), ("192.0.2.1", "US"))
+        mock_get.assert_called_once_with("https://ipapi.co/json/", proxies=None, timeout=TIMEOUT)
+        mock_info.assert_not_called()
+        self.assertEqual(load_cache("192.0.2.1")["info"].country_name, "US")
+
+    @patch('main.get_ip_info', return_value=GeoInfo("DE", "N/A", "N/A", "N/A", "N/A", "N/A"))
+    @patch('main.get_ip_address', return_value="2001:db8::1")
+    @patch('main.SESSION.get')
+    def test_get_own_ip_info_uncached_probe_mismatch(self, mock_get, mock_address, mock_info):
+        mock_get.return_value.json.return_value = {"ip": "192.0.2.1", "country_name": "US"}
+        ip, info = get_own_ip_info_uncached('ipv6')
+        self.assertEqual((ip, info.country_name), ("2001:db8::1", "DE"))
+        mock_info.assert_called_once_with("2001:db8::1", None, skip_cache=True)
+
+    @patch('main.get_own_ip_info_uncached')
+    @patch('main.get_ip_info', return_value=GeoInfo("DE", "N/A", "N/A", "N/A", "N/A", "N/A"))
+    @patch('main.get_ip_address', return_value="192.0.2.1")
+    def test_main_cached_path_skips_probe(self, mock_address, mock_info, mock_uncached):
+        result = CliRunner().invoke(app, ["ipv4"])
+        self.assertEqual(result.exit_code, 0)
+        mock_uncached.assert_not_called()
+
+    def test_main_ips_file_missing(self):
+        result = CliRunner().invoke(app, ["--ips-file", "/nonexistent/ips.txt"])
+        self.assertEqual(result.exit_code, 2)
+        self.assertNotIsInstance(result.exception, FileNotFoundError)
+
+    @patch('main.lookup_local', return_value=None)
+    @patch('main.SESSION.post')
+    def test_get_ip_info_bulk(self, mock_post, mock_local):
+        save_cache("192.0.2.1", _norm_cached({"country_name": "Cached"}))
+        mock_resp = unittest.mock.Mock()
+        mock_resp.json.return_value = [
+            {"status": "success", "query": "192.0.2.2", "country": "US", "city": "NY",
+             "lat": 1, "lon": 2, "isp": "ISP", "org": "Org", "as": "AS15169 Google LLC"},
+            {"status": "fail", "query": "192.0.2.3", "message": "reserved range"}
+        ]
+        mock_resp.status_code = 200
+        mock_post.return_value = mock_resp
+        batches = list(get_ip_info_bulk(["192.0.2.1", "192.0.2.2", "192.0.2.3", "192.0.2.2"]))
+        self.assertEqual([chunk for chunk, _ in batches], [["192.0.2.1"], ["192.0.2.2", "192.0.2.3"]])
+        infos = {ip: info for _, batch in batches for ip, info in batch.items()}
+        self.assertEqual(infos["192.0.2.1"].country_name, "Cached")
+        self.assertEqual(infos["192.0.2.2"].org, "Org")
+        self.assertEqual(infos["192.0.2.2"].asn, "AS15169")
+        self.assertNotIn("192.0.2.3", infos)
+        mock_post.assert_called_once()
+        self.assertEqual(mock_post.call_args.kwargs["json"], ["192.0.2.2", "192.0.2.3"])
+        self.assertEqual(mock_post.call_args.args[0], BULK_URL)
+
+    @patch('main.lookup_local', return_value=None)
+    @patch('main.SESSION.post')
+    def test_main_ips_file_bulk_url(self, mock_post, mock_local):
+        mock_post.return_value.json.return_value = []
+        ips_file = Path(self.tmp.name) / "ips.txt"
+        ips_file.write_text("192.0.2.1\n")
+        url = "https://pro.ip-api.com/batch?key=KEY"
+        result = CliRunner().invoke(app, ["--ips-file", str(ips_file)], env={"IPINFO_BULK_URL": url})
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(mock_post.call_args.args[0], url)
+
+    @patch('main.lookup_local', return_value=None)
+    @patch('main._refresh_cache')
+    @patch('main.SESSION.get')
+    def test_get_ip_info_stale_while_revalidate(self, mock_get, mock_refresh, mock_local):
+        save_cache("192.0.2.1", _norm_cached({"country_name": "US"}))
+        with patch('main.time.time', return_value=time.time() + CACHE_TTL + 1):
+            info = get_ip_info("192.0.2.1")
+        wait_for_refreshes()
+        self.assertEqual(info.country_name, "US")
+        mock_get.assert_not_called()
+        mock_refresh.assert_called_once_with("192.0.2.1", None)
+
+    @patch('main.lookup_local', return_value=None)
+    @patch('main.SESSION.get')
+    def test_get_ip_info_failed_refresh_not_retried(self, mock_get, mock_local):
+        mock_get.side_effect = requests.RequestException("fail")
+        save_cache("192.0.2.1", _norm_cached({"country_name": "US"}))
+        with patch('main.time.time', return_value=time.time() + CACHE_TTL + 1):
+            for _ in range(3):
+                self.assertEqual(get_ip_info("192.0.2.1").country_name, "US")
+                wait_for_refreshes()
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch('main.SESSION.get')
+    def test_refresh_cache_logs_unexpected_errors(self, mock_get):
+        mock_get.return_value.json.side_effect = ValueError("not JSON")
+        with patch('main.typer.echo') as mock_echo:
+            _refresh_cache("192.0.2.1", None)
+        self.assertIn("Background refresh failed for 192.0.2.1", mock_echo.call_args.args[0])
+
+    @patch('main.lookup_local', return_value=None)
     @patch('main.load_cache', return_value=None)
-    @patch('requests.get')
-    def test_get_ip_info_success(self, mock_get, mock_cache):
+    @patch('main.SESSION.get')
+    def test_get_ip_info_success(self, mock_get, mock_cache, mock_local):
         mock_response = unittest.mock.Mock()
         mock_response.json.return_value = {
             "country_name": "US", "city": "NY", "latitude": 0,
@@ -204,17 +782,17 @@ class TestIpAddressApp(unittest.TestCase):
         mock_response.status_code = 200
         mock_get.return_value = mock_response
         info = get_ip_info("0.0.0.0")
-        self.assertEqual(info["country_name"], "US")
+        self.assertEqual(info.country_name, "US")
         mock_get.assert_called_once_with(
             "https://ipapi.co/0.0.0.0/json/",
             proxies=None,
-            verify=False,
-            timeout=5
+            timeout=TIMEOUT
         )
 
+    @patch('main.lookup_local', return_value=None)
     @patch('main.load_cache', return_value=None)
-    @patch('requests.get')
-    def test_get_ip_info_rate_limit_fallback(self, mock_get, mock_cache):
+    @patch('main.SESSION.get')
+    def test_get_ip_info_rate_limit_fallback(self, mock_get, mock_cache, mock_local):
         response_429 = unittest.mock.Mock()
         response_429.status_code = 429
         http_err = requests.HTTPError(response=response_429)
@@ -227,46 +805,155 @@ class TestIpAddressApp(unittest.TestCase):
             return mock_fb
         mock_get.side_effect = side_effect
         info = get_ip_info("1.2.3.4")
-        self.assertEqual(info["country_name"], "FB")
+        self.assertEqual(info.country_name, "FB")
         self.assertEqual(mock_get.call_count, 2)
 
+    @patch('main.lookup_local', return_value=None)
     @patch('main.load_cache', return_value=None)
-    @patch('requests.get')
-    def test_get_ip_info_network_error(self, mock_get, mock_cache):
+    @patch('main.SESSION.get')
+    def test_get_ip_info_network_error(self, mock_get, mock_cache, mock_local):
         mock_get.side_effect = requests.RequestException("fail")
         with self.assertRaises(typer.Exit):
             get_ip_info("1.2.3.4")
 
-    @patch('requests.get')
+    def test_lookup_local_bundled_db_fields(self):
+        info = lookup_local("8.8.8.8")
+        self.assertEqual(info.country_name, "United States")
+        self.assertEqual(info.org, "GOOGLE")
+        # The bundled database carries no city, coordinates or AS number
+        self.assertEqual((info.city, info.latitude, info.longitude, info.asn), ("N/A",) * 4)
+
+    @patch('main._geo')
+    @patch('main.SESSION.get')
+    def test_get_ip_info_remote_skips_local_db(self, mock_get, mock_geo):
+        mock_response = unittest.mock.Mock()
+        mock_response.json.return_value = {
+            "country_name": "United States", "city": "Mountain View", "latitude": 37.4,
+            "longitude": -122.1, "org": "GOOGLE", "asn": "AS15169"
+        }
+        mock_response.status_code = 200
+        mock_get.return_value = mock_response
+        info = get_ip_info("8.8.8.8")
+        self.assertEqual(info.city, "Mountain View")
+        self.assertEqual(info.asn, "AS15169")
+        mock_geo.assert_not_called()
+
+    @patch('main.SESSION.get')
+    def test_get_ip_info_local_on_remote_failure(self, mock_get):
+        mock_get.side_effect = requests.RequestException("fail")
+        info = get_ip_info("8.8.8.8")
+        self.assertEqual(info.country_name, "United States")
+        self.assertEqual(info.city, "N/A")
+
+    def test_norm_geodb_coerces_missing_values(self):
+        info = _norm_geodb({"country": "DE", "city": None, "latitude": None, "IPv4": "192.0.2.1"})
+        self.assertEqual(info, GeoInfo("DE", "N/A", 0, 0, "192.0.2.1", "N/A"))
+
+    def test_make_normalizer(self):
+        norm = _make_normalizer("_norm_test", {
+            "country_name": (("a", "b"), "N/A"),
+            "city": (("c",), "N/A"),
+            "latitude": (("lat",), "N/A"),
+            "longitude": ((), 0),
+            "org": (("org",), "N/A"),
+            "asn": (("asn",), "N/A")
+        })
+        self.assertEqual(norm.__name__, "_norm_test")
+        # Without coerce_missing only the first key is read and values are kept as sent
+        self.assertEqual(
+            norm({"a": "X", "b": "Y", "c": None, "lat": 0}),
+            GeoInfo("X", None, 0, 0, "N/A", "N/A")
+        )
+
+    def test_lookup_local_private_miss(self):
+        self.assertIsNone(lookup_local("10.0.0.1"))
+
+    @patch('main.SESSION.get')
     def test_get_ip_address_ipv4(self, mock_get):
         mock_resp = unittest.mock.Mock()
-        mock_resp.text = "192.0.2.1"
+        mock_resp.content = b"192.0.2.1\n"
         mock_resp.status_code = 200
         mock_get.return_value = mock_resp
         ip_address = get_ip_address('ipv4')
         self.assertEqual(ip_address, "192.0.2.1")
         mock_get.assert_called_once_with(
-            "https://api.ipify.org", proxies=None, verify=False, timeout=5
+            "https://api.ipify.org", proxies=None, timeout=TIMEOUT
         )
 
-    @patch('requests.get')
+    @patch('main.SESSION.get')
     def test_get_ip_address_ipv6(self, mock_get):
-        mock_resp = unittest.mock.Mock()
-        mock_resp.text = "2001:db8::1"
-        mock_resp.status_code = 200
-        mock_get.return_value = mock_resp
+        def side_effect(url, **kwargs):
+            if 'icanhazip' in url:
+                raise requests.RequestException("unreachable")
+            mock_resp = unittest.mock.Mock()
+            mock_resp.content = b"2001:db8::1\n"
+            mock_resp.status_code = 200
+            return mock_resp
+        mock_get.side_effect = side_effect
         ip_address = get_ip_address('ipv6')
         self.assertEqual(ip_address, "2001:db8::1")
-        mock_get.assert_called_once_with(
-            "https://api6.ipify.org", proxies=None, verify=False, timeout=5
+        mock_get.assert_any_call(
+            "https://api6.ipify.org", proxies=None, timeout=TIMEOUT
         )
 
+    @patch('main.SESSION.get')
+    def test_get_ip_address_ipv6_all_fail(self, mock_get):
+        mock_get.side_effect = requests.RequestException("unreachable")
+        with self.assertRaises(typer.Exit):
+            get_ip_address('ipv6')
+        self.assertEqual(mock_get.call_count, 2)
+
+    def test_session_does_not_retry_429(self):
+        hits = []
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                hits.append(self.path)
+                self.send_response(429)
+                self.send_header("Retry-After", "4")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            def log_message(self, *args):
+                pass
+        server = http.server.HTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        start = time.monotonic()
+        resp = SESSION.get(f"http://127.0.0.1:{server.server_port}/", timeout=TIMEOUT)
+        self.assertEqual(resp.status_code, 429)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(len(hits), 1)
+
+    def test_session_read_timeout_not_retried(self):
+        # A host that accepts but never answers must fail after one read timeout
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen(8)
+        self.addCleanup(server.close)
+        accepted = []
+        def accept_loop():
+            try:
+                while True:
+                    accepted.append(server.accept()[0])
+            except OSError:
+                pass
+        threading.Thread(target=accept_loop, daemon=True).start()
+        retries = SESSION.get_adapter("https://api6.ipify.org").max_retries
+        self.assertEqual((retries.connect, retries.read), (0, 0))
+        start = time.monotonic()
+        with self.assertRaises(requests.RequestException):
+            SESSION.get(f"http://127.0.0.1:{server.getsockname()[1]}/", timeout=(TIMEOUT[0], 0.3))
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(len(accepted), 1)
+        for conn in accepted:
+            conn.close()
+
     def test_get_ip_address_invalid_type(self):
         with self.assertRaises(typer.Exit):
             get_ip_address('invalid')
 
     @patch('main.load_cache', return_value=None)
-    @patch('requests.get')
+    @patch('main.SESSION.get')
     def test_get_ip_address_request_error(self, mock_get, mock_cache):
         mock_get.side_effect = requests.RequestException("Request failed")
         with self.assertRaises(typer.Exit):